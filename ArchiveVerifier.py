@@ -4,12 +4,37 @@ import json
 import signal
 import hashlib
 import argparse
+import sqlite3
 import subprocess
+import tempfile
+import zlib
+import mmap
+import time
+import struct
+import queue
 import locale
+import logging
 import concurrent.futures
+import multiprocessing
 import threading
 from pathlib import Path
-from collections import OrderedDict
+
+try:
+    import orjson  # Optional fast JSON codec
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash  # Optional fast content fingerprints
+except ImportError:
+    xxhash = None
+
+try:
+    import libarchive  # Optional in-process verification (libarchive-c)
+except (ImportError, OSError, AttributeError, TypeError):
+    # The package loads the native library on import, which fails this way
+    # when libarchive itself is missing or cannot be found
+    libarchive = None
 
 # ================== I18N Support ==================
 LANG_DICT = {
@@ -26,13 +51,20 @@ LANG_DICT = {
         "files_to_verify": "\n▶ Found {total} files to verify\n",
         "dir_not_exist": "Error: Directory {path} does not exist",
         "7z_not_found": "7z.exe not found at {path}",
+        "libarchive_not_found": "In-process mode requires the libarchive-c package",
+        "progress_not_found": "No verification progress found at {path}",
+        "not_reported": "7-Zip did not report a result",
+        "inproc_unsupported": "Skipped {path}: libarchive cannot test this archive, 7-Zip is needed",
         "argparse_description": "Incremental compressed file verification tool",
         "argparse_directory_help": "Directory path to scan",
         "argparse_7zip_help": "Path to 7z.exe (default: %(default)s)",
         "argparse_exe_help": "Include executable files in scan",
         "argparse_lang_help": "Force output language (en/zh)",
         "argparse_output_help": "Output directory for results (default: %(default)s)",
-        "argparse_threads_help": "Number of verification threads (default: %(default)s)"
+        "argparse_threads_help": "Number of verification threads (default: %(default)s)",
+        "argparse_mode_help": "Verify with 7-Zip subprocesses or in-process with libarchive (default: %(default)s)",
+        "argparse_quiet_help": "Suppress per-file output",
+        "argparse_watch_help": "Follow results of a verification running on this directory"
     },
     "zh": {
         "terminating": "\n正在安全终止进程...",
@@ -47,13 +79,20 @@ LANG_DICT = {
         "files_to_verify": "\n▶ 发现 {total} 个待验证文件\n",
         "dir_not_exist": "错误：目录 {path} 不存在",
         "7z_not_found": "未找到 7z.exe（路径：{path}）",
+        "libarchive_not_found": "进程内模式需要安装 libarchive-c 包",
+        "progress_not_found": "未找到验证进度（路径：{path}）",
+        "not_reported": "7-Zip 未报告结果",
+        "inproc_unsupported": "已跳过 {path}：libarchive 无法验证此压缩包，需要 7-Zip",
         "argparse_description": "增量式压缩文件验证工具",
         "argparse_directory_help": "需要扫描的目录路径",
         "argparse_7zip_help": "7z.exe 路径（默认：%(default)s）",
         "argparse_exe_help": "包含可执行文件扫描",
         "argparse_lang_help": "强制指定输出语言（zh/en）",
         "argparse_output_help": "结果输出目录（默认：%(default)s）",
-        "argparse_threads_help": "验证线程数（默认：%(default)s）"
+        "argparse_threads_help": "验证线程数（默认：%(default)s）",
+        "argparse_mode_help": "使用 7-Zip 子进程或 libarchive 进程内验证（默认：%(default)s）",
+        "argparse_quiet_help": "不输出逐文件信息",
+        "argparse_watch_help": "跟踪此目录正在进行的验证结果"
     }
 }
 
@@ -87,52 +126,339 @@ LANG = I18N()  # Initialize internationalization
 
 # Global termination flag
 exit_flag = False
-# Dictionary to track processes across threads
-current_processes = {}
+# Suppress per-file output (--quiet)
+quiet = False
+# Set of running 7-Zip processes across threads
+current_processes = set()
 # Lock for thread safety
 current_processes_lock = threading.Lock()
+# Event shared with in-process workers so Ctrl+C stops them between blocks
+inproc_stop = None
+# Start 7-Zip outside our console group so Ctrl+C reaches only this process
+if os.name == 'nt':
+    SUBPROCESS_GROUP_KWARGS = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    SUBPROCESS_GROUP_KWARGS = {'start_new_session': True}
+# Optional per-file columns, omitted from JSON records while unknown
+FILE_EXTRA_COLUMNS = {'size': 'INTEGER', 'fp': 'TEXT', 'method': 'TEXT'}
+# Longest time queued results wait before the writer commits them
+WRITER_FLUSH_INTERVAL = 0.2
+# Directory scan is I/O bound, so use more threads than cores
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# DirEntry.stat() is free on Windows but costs one syscall per file elsewhere
+DEFER_STAT = os.name != 'nt'
+# Entries per stat task when a large directory is split across the pool
+STAT_BATCH = 128
+# Bytes hashed from each end of a file for change detection
+FINGERPRINT_CHUNK = 64 * 1024
+# Results that survive an mtime change when the fingerprint still matches;
+# failures are always retested since preallocated downloads keep size and ends
+FINGERPRINT_KEEP_RESULTS = {'success', 'encrypted'}
+# libarchive error fragments that indicate a password-protected archive
+INPROC_ENCRYPTED_KEYWORDS = ('passphrase', 'password', 'encrypt')
+# libarchive error fragments for formats and methods it cannot decode (e.g. Deflate64),
+# such archives are handed to 7-Zip rather than reported as corrupt
+INPROC_UNSUPPORTED_KEYWORDS = ('unsupported', 'not supported', 'unavailable',
+                               'unknown codec', 'unrecognized archive format')
+# libarchive-c only logs ARCHIVE_WARN results (e.g. a bad ZIP CRC) to this logger
+INPROC_WARNING_LOGGER = 'libarchive'
+# Bytes decoded per read in in-process mode, the interruption check granularity
+INPROC_BLOCK_SIZE = 1024 * 1024
+# Read size when checksumming whole files against sidecars
+CHECKSUM_CHUNK = 1024 * 1024
+# PAR2 packet header magic and file description packet type
+PAR2_MAGIC = b'PAR2\0PKT'
+PAR2_FILE_DESC = b'PAR 2.0\0FileDesc'
+# Progress ring file size, header size and record layout
+PROGRESS_SIZE = 1 << 20
+PROGRESS_HEADER = 64
+PROGRESS_RECORD = struct.Struct('<QB255s')
+PROGRESS_SLOTS = (PROGRESS_SIZE - PROGRESS_HEADER) // PROGRESS_RECORD.size
+# Status codes stored in progress records and their messages
+PROGRESS_STATUS = {'success': 1, 'encrypted': 2, 'failure': 3}
+PROGRESS_MESSAGES = {1: "verify_success", 2: "encrypted_file", 3: "verify_fail"}
+# Maximum number of archives handed to a single 7-Zip process
+BATCH_SIZE = 64
+# Archive suffixes picked up by the scan, as tuples for str.endswith
+ARCHIVE_SUFFIXES = ('.zip', '.7z', '.001', '.rar')
+ARCHIVE_SUFFIXES_EXE = ARCHIVE_SUFFIXES + ('.exe',)
+# Volume number of multi-part RAR archives
+RAR_PART_RE = re.compile(r'part(\d+)\.rar\Z', re.IGNORECASE)
+# Per-archive banners in 7-Zip test output
+SEVEN_ZIP_BANNER_RE = re.compile(rb'^(?:Testing archive: (?P<archive>.+)|Everything is Ok)')
+# 7-Zip messages that indicate a password-protected archive
+SEVEN_ZIP_ENCRYPTED_RE = re.compile(rb'password|encrypted', re.IGNORECASE)
 
 def signal_handler(sig, frame):
     """Handle termination signals (Ctrl+C) and clean up resources"""
     global exit_flag
     print(LANG("terminating"))
     exit_flag = True
+    if inproc_stop is not None:
+        inproc_stop.set()
     
-    # Terminate all running processes
+    # Terminate all running processes, no per-process poll() needed
     with current_processes_lock:
-        for process in list(current_processes.values()):
-            if process and process.poll() is None:
-                process.terminate()
+        processes = list(current_processes)
+    for process in processes:
+        try:
+            process.terminate()
+        except OSError:
+            pass  # Already exited
+
+def print_file_event(key, path):
+    """Print a per-file progress line unless quiet output was requested"""
+    if not quiet:
+        print(LANG(key, path=path))
+
+class ProgressRing:
+    """Memory-mapped ring of verification results that viewers read without locks
+
+    Layout: uint64 head counter at offset 0, then PROGRESS_SLOTS records of
+    (wall clock ns, status code, UTF-8 path tail) starting at PROGRESS_HEADER.
+    The single writer fills a slot before publishing the incremented head.
+    """
+    def __init__(self, path, writable=True):
+        flags = (os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY) | getattr(os, 'O_BINARY', 0)
+        fd = os.open(path, flags, 0o666)
+        try:
+            if writable and os.fstat(fd).st_size < PROGRESS_SIZE:
+                os.ftruncate(fd, PROGRESS_SIZE)
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self.buf = mmap.mmap(fd, PROGRESS_SIZE, access=access)
+        finally:
+            os.close(fd)
+    
+    def head(self):
+        """Number of records published so far"""
+        return struct.unpack_from('<Q', self.buf, 0)[0]
+    
+    def push(self, path, result):
+        """Publish one verification result (writer side)"""
+        head = self.head()
+        offset = PROGRESS_HEADER + (head % PROGRESS_SLOTS) * PROGRESS_RECORD.size
+        encoded = path.encode('utf-8', errors='replace')[-255:]
+        PROGRESS_RECORD.pack_into(self.buf, offset, time.time_ns(), PROGRESS_STATUS[result], encoded)
+        struct.pack_into('<Q', self.buf, 0, head + 1)
+    
+    def read_since(self, seen):
+        """Return (head, records) for results published after `seen` (reader side)"""
+        head = self.head()
+        if head < seen:
+            seen = 0  # Ring file was recreated
+        start = max(seen, head - PROGRESS_SLOTS)
+        records = []
+        for i in range(start, head):
+            offset = PROGRESS_HEADER + (i % PROGRESS_SLOTS) * PROGRESS_RECORD.size
+            ts, status, encoded = PROGRESS_RECORD.unpack_from(self.buf, offset)
+            records.append((ts, status, encoded.rstrip(b'\0').decode('utf-8', errors='replace')))
+        # Drop records the writer overwrote while we were copying, including the
+        # slot of the next unpublished record, which may have been half written
+        lapped = self.head() + 1 - PROGRESS_SLOTS - start
+        return head, records[max(0, lapped):]
+    
+    def close(self):
+        """Unmap the ring file"""
+        self.buf.close()
+
+def watch_progress(progress_file):
+    """Print results published by a running verification until interrupted"""
+    try:
+        ring = ProgressRing(progress_file, writable=False)
+    except (OSError, ValueError):
+        print(LANG("progress_not_found", path=progress_file))
+        return
+    seen = ring.head()
+    try:
+        while True:
+            seen, records = ring.read_since(seen)
+            for _, status, path in records:
+                key = PROGRESS_MESSAGES.get(status)
+                if key:  # Skip torn or unknown records
+                    print(LANG(key, path=path))
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
 
 def get_dir_hash(target_dir):
-    """Generate MD5 hash for directory path (first 8 characters)"""
-    abs_path = str(target_dir.resolve())
-    return hashlib.md5(abs_path.encode()).hexdigest()[:8]
+    """Generate MD5 hash for a resolved directory path (first 8 characters)
+
+    MD5 is kept on purpose: the hash names existing result files.
+    """
+    return hashlib.md5(str(target_dir).encode()).hexdigest()[:8]
+
+def scan_fingerprint(physical):
+    """Hash the sorted (path, mtime) pairs of a scan to detect unchanged trees"""
+    h = xxhash.xxh3_64() if xxhash else hashlib.blake2b(digest_size=8)
+    for path in sorted(physical):
+        h.update(path.encode('utf-8', errors='surrogateescape') + b'\0')
+        h.update(physical[path].to_bytes(8, 'little', signed=True))
+    return h.hexdigest()
+
+def file_fingerprint(path):
+    """Return (size, fingerprint) from the first and last 64 KiB of a file"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if xxhash:
+            h, tag = xxhash.xxh3_64(), 'xxh3'
+        else:
+            h, tag = hashlib.blake2b(digest_size=8), 'b2'
+        h.update(f.read(FINGERPRINT_CHUNK))
+        if size > FINGERPRINT_CHUNK:
+            f.seek(max(FINGERPRINT_CHUNK, size - FINGERPRINT_CHUNK))
+            h.update(f.read(FINGERPRINT_CHUNK))
+    return size, f"{tag}:{h.hexdigest()}"
+
+def content_unchanged(path, record):
+    """Check whether a file with a new mtime still matches its recorded fingerprint"""
+    if not record.get('fp'):
+        return False
+    try:
+        if os.stat(path).st_size != record.get('size'):
+            return False
+        return file_fingerprint(path)[1] == record['fp']
+    except OSError:
+        return False
+
+def is_multi_volume(path):
+    """Check if an archive spans several volume files"""
+    name = path.lower()
+    if RAR_PART_RE.search(name) or name.endswith('.001'):
+        return True
+    stem = os.path.splitext(path)[0]
+    return os.path.exists(stem + '.r00') or os.path.exists(stem + '.z01')
+
+def read_sidecar_checksums(path):
+    """Yield (method, checksum) pairs recorded for a file in .sfv/.par2 sidecars"""
+    name = os.path.basename(path).lower()
+    stem = os.path.splitext(path)[0]
+
+    for sidecar in (path + '.sfv', stem + '.sfv'):
+        try:
+            with open(sidecar, 'r', encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            if line.startswith(';'):
+                continue  # Comment
+            entry, _, crc = line.strip().rpartition(' ')
+            if entry.strip().lower() == name and len(crc) == 8:
+                yield 'sfv', crc.lower()
+
+    for sidecar in (path + '.par2', stem + '.par2'):
+        try:
+            with open(sidecar, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        # Walk the packets and pick the full-file MD5 from FileDesc packets
+        offset = data.find(PAR2_MAGIC)
+        while offset >= 0:
+            length = int.from_bytes(data[offset + 8:offset + 16], 'little')
+            if length < 64:
+                break
+            if data[offset + 48:offset + 64] == PAR2_FILE_DESC:
+                body = data[offset + 64:offset + length]
+                entry = body[56:].rstrip(b'\0').decode('utf-8', errors='replace')
+                if entry.lower() == name:
+                    yield 'par2', body[16:32].hex()
+            offset = data.find(PAR2_MAGIC, offset + length)
+
+def file_checksum(path, method):
+    """Compute the CRC32 (sfv) or MD5 (par2) of a whole file"""
+    h = hashlib.md5() if method == 'par2' else None
+    crc = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHECKSUM_CHUNK):
+            if h:
+                h.update(chunk)
+            else:
+                crc = zlib.crc32(chunk, crc)
+    return h.hexdigest() if h else f"{crc:08x}"
+
+def verify_sidecar(path):
+    """Check an archive against its checksum sidecars, returning the method on a match"""
+    # Sidecars cover single files, only 7-Zip checks all volumes of a set
+    if is_multi_volume(path):
+        return None
+    try:
+        for method, expected in read_sidecar_checksums(path):
+            if file_checksum(path, method) == expected:
+                return method
+    except OSError:
+        pass
+    return None
 
 def is_first_volume(filename):
     """Check if RAR file is the first volume in a multi-part archive"""
-    name = filename.lower()
-    if match := re.search(r'part(\d+)\.rar$', name):
-        return int(match.group(1).lstrip('0') or '0') == 1
-    return True
+    match = RAR_PART_RE.search(filename)
+    return not match or int(match.group(1)) == 1
+
+def stat_entries(entries):
+    """Collect (path, mtime) pairs for a batch of directory entries"""
+    files = []
+    for entry in entries:
+        try:
+            files.append((entry.path, entry.stat().st_mtime_ns))
+        except OSError:
+            continue
+    return files, [], []
+
+def scan_directory(directory, extensions):
+    """List matching files and subdirectories of one directory without following symlinks
+
+    Returns (files, subdirs, unstated) where unstated holds matching entries of
+    large directories that are left for the caller to stat in batches.
+    """
+    entries, subdirs = [], []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                # Keep archives, skipping non-first RAR volumes in the same pass
+                name = entry.name.lower()
+                if name.endswith(extensions) and (
+                        not name.endswith('.rar') or is_first_volume(name)):
+                    entries.append(entry)
+    except OSError:
+        pass  # Unreadable directory, skip like rglob did
+    if DEFER_STAT and len(entries) > STAT_BATCH:
+        return [], subdirs, entries
+    return stat_entries(entries)[0], subdirs, []
 
 def scan_physical_files(directory, check_exe):
     """Scan directory for archive files and executables (if enabled)"""
-    extensions = {'.zip', '.7z', '.001', '.rar'}
-    if check_exe: extensions.add('.exe')
+    extensions = ARCHIVE_SUFFIXES_EXE if check_exe else ARCHIVE_SUFFIXES
     
-    found = OrderedDict()
-    for f in directory.rglob('*'):
-        if f.suffix.lower() in extensions:
-            if f.suffix.lower() == '.rar' and not is_first_volume(f.name):
-                continue
-            abs_path = str(f.resolve())
-            found[abs_path] = f.stat().st_mtime_ns
+    found = {}
+    # Every directory is its own task so stat latency overlaps across the tree;
+    # entry paths are built on the already resolved root, no per-file resolve()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        pending = {executor.submit(scan_directory, str(directory), extensions)}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                files, subdirs, unstated = future.result()
+                found.update(files)
+                pending.update(
+                    executor.submit(scan_directory, subdir, extensions) for subdir in subdirs
+                )
+                # Spread the stat calls of large directories over the pool
+                pending.update(
+                    executor.submit(stat_entries, batch) for batch in chunks(unstated, STAT_BATCH)
+                )
     return found
 
 def merge_file_records(existing, physical):
     """Merge existing records with physical filesystem scan results"""
-    merged = OrderedDict()
+    merged = {}
     
     # Process existing records
     for path, record in existing.items():
@@ -142,10 +468,16 @@ def merge_file_records(existing, physical):
                     'result': 'deleted',
                     'timestamp': record['timestamp']
                 }
-                print(LANG("file_deleted", path=path))
+                print_file_event("file_deleted", path)
         else:
             new_record = record.copy()
-            if record['timestamp'] != physical[path]:
+            if record['timestamp'] == physical[path]:
+                pass
+            elif (record['result'] in FINGERPRINT_KEEP_RESULTS
+                    and content_unchanged(path, record)):
+                # Only the mtime moved (touch, copy, restore), keep the result
+                new_record['timestamp'] = physical[path]
+            else:
                 new_record.update({
                     'result': 'unchecked',
                     'timestamp': physical[path]
@@ -155,7 +487,7 @@ def merge_file_records(existing, physical):
     # Process new files
     new_files = set(physical.keys()) - set(existing.keys())
     for path in new_files:
-        print(LANG("new_file", path=path))
+        print_file_event("new_file", path)
     
     # Merge physical files
     for path, mtime in physical.items():
@@ -165,137 +497,522 @@ def merge_file_records(existing, physical):
                 'timestamp': mtime
             }
     
-    return OrderedDict(sorted(merged.items(), key=lambda x: x[0]))
+    # Unsorted, the export orders records by path
+    return merged
+
+def json_loads(raw):
+    """Decode JSON bytes, using orjson when available"""
+    if orjson:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+def json_dumps(data):
+    """Encode data as indented UTF-8 JSON bytes, using orjson when available"""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+def open_result_db(db_file):
+    """Open the SQLite result database in WAL mode, creating tables if needed"""
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS files "
+        "(path TEXT PRIMARY KEY, result TEXT, timestamp INTEGER)"
+    )
+    # Add columns introduced after the database was first created
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+    for name, column_type in FILE_EXTRA_COLUMNS.items():
+        if name not in columns:
+            conn.execute(f"ALTER TABLE files ADD COLUMN {name} {column_type}")
+    return conn
+
+def load_results(conn, json_file, target_dir):
+    """Load records from the database, migrating a legacy JSON result file on first run"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'target_directory'").fetchone()
+    if row is None and json_file.exists():
+        with open(json_file, 'rb') as f:
+            return json_loads(f.read())
+
+    files = {}
+    for path, result, timestamp, size, fp, method in conn.execute(
+            "SELECT path, result, timestamp, size, fp, method FROM files ORDER BY path"):
+        files[path] = {'result': result, 'timestamp': timestamp}
+        if fp is not None:
+            files[path].update({'size': size, 'fp': fp})
+        if method is not None:
+            files[path]['method'] = method
+    return {
+        "target_directory": row[0] if row else str(target_dir),
+        "files": files
+    }
+
+def load_meta(conn, key, default=None):
+    """Return a value from the meta table"""
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def load_scan_fingerprint(conn):
+    """Return the scan fingerprint stored with the last merged state, if any"""
+    return load_meta(conn, 'scan_fp')
+
+def bump_revision(conn):
+    """Count a write to the files table, call inside the writing transaction"""
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', "
+        "COALESCE((SELECT value FROM meta WHERE key = 'revision'), 0) + 1)"
+    )
+
+def save_results(conn, data, scan_fp):
+    """Replace all database records with the merged scan state"""
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [('target_directory', data['target_directory']), ('scan_fp', scan_fp)]
+        )
+        conn.execute("DELETE FROM files")
+        conn.executemany(
+            "INSERT INTO files (path, result, timestamp, size, fp, method) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((path, record['result'], record['timestamp'], record.get('size'),
+              record.get('fp'), record.get('method'))
+             for path, record in data['files'].items())
+        )
+        bump_revision(conn)
+
+def export_results(conn, json_file, target_dir):
+    """Write the database back out as the JSON result file"""
+    data = load_results(conn, json_file, target_dir)
+    temp_file = f"{json_file}.tmp.{os.getpid()}"
+    with open(temp_file, 'wb') as f:
+        f.write(json_dumps(data))
+    os.replace(temp_file, json_file)
+
+def close_results(conn, json_file, target_dir):
+    """Fold the write-ahead log into the database, export JSON if behind and close"""
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        # The export records the revision it wrote, so a run killed before
+        # exporting leaves the marker behind and the next run catches up
+        revision = str(load_meta(conn, 'revision', 0))
+        if load_meta(conn, 'exported_revision') != revision or not json_file.exists():
+            export_results(conn, json_file, target_dir)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('exported_revision', ?)",
+                    (revision,)
+                )
+    finally:
+        conn.close()
+
+class ResultWriter:
+    """Background thread that owns the database connection and applies queued results
+
+    Workers enqueue updates and return straight away; the writer coalesces
+    everything queued within WRITER_FLUSH_INTERVAL into one transaction and is
+    also the only producer of the progress ring.
+    """
+    def __init__(self, db_file, ring=None):
+        self.queue = queue.Queue()
+        self.ring = ring
+        self.thread = threading.Thread(target=self.run, args=(db_file,), daemon=True)
+        self.thread.start()
+    
+    def put(self, file_path, fields):
+        """Queue (result, size, fp, method) for a verified file"""
+        self.queue.put((file_path, fields))
+    
+    def close(self):
+        """Flush outstanding updates and stop the writer thread"""
+        self.queue.put(None)
+        self.thread.join()
+    
+    def run(self, db_file):
+        """Writer loop, collects updates until the flush deadline then commits them"""
+        conn = open_result_db(db_file)
+        stop = False
+        try:
+            while not stop:
+                updates = []
+                item = self.queue.get()
+                deadline = time.monotonic() + WRITER_FLUSH_INTERVAL
+                while item is not None:
+                    updates.append(item)
+                    try:
+                        item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                stop = item is None
+                if updates:
+                    self.apply(conn, updates)
+        finally:
+            conn.close()
+    
+    def apply(self, conn, updates):
+        """Write a group of updates in one transaction and publish them"""
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE files SET result = ?, size = ?, fp = ?, method = ? "
+                    "WHERE path = ? AND result != 'deleted'",
+                    (fields + (file_path,) for file_path, fields in updates)
+                )
+                bump_revision(conn)
+        except Exception as e:
+            paths = ", ".join(file_path for file_path, _ in updates)
+            print(LANG("process_error", path=paths, error=str(e)))
+            return
+        if self.ring:
+            for file_path, fields in updates:
+                self.ring.push(file_path, fields[0])
 
 def verify_7z_availability(seven_zip_exe):
     """Validate 7-Zip executable path exists"""
     if not Path(seven_zip_exe).exists():
         raise FileNotFoundError(LANG("7z_not_found", path=seven_zip_exe))
 
-def process_file(result_file, seven_zip_exe, file_path):
-    """Validate archive file integrity using 7-Zip and update results"""
-    global current_processes
-    if exit_flag: return
+def chunks(items, size):
+    """Split a list into consecutive slices of at most `size` items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
-    print(LANG("verifying", path=file_path))
-    temp_file = f"{result_file}.tmp.{os.getpid()}.{threading.get_ident()}"
-    
+def verify_batch(seven_zip_exe, paths):
+    """Test several archives with a single 7-Zip process, yielding (path, result, method)
+
+    A result of None means the archive was interrupted before 7-Zip finished it;
+    archives 7-Zip never reports on are not yielded and stay unchecked.
+    """
+    # A missing archive aborts the whole 7-Zip run, leave deleted ones for the next scan
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return
+    # 7-Zip echoes archive paths as found on disk, match them case-insensitively on Windows
+    pending = {os.path.normcase(path): path for path in paths}
+
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+        f.write('\n'.join(paths))
+        list_file = f.name
+
+    def finish(path, ok, is_encrypted):
+        pending.pop(os.path.normcase(path), None)
+        if ok:
+            return path, 'success', '7z'
+        elif is_encrypted:
+            return path, 'encrypted', '7z'
+        elif not exit_flag:
+            return path, 'failure', '7z'
+        return path, None, '7z'
+
+    process = None
     try:
-        # Run verification command
+        # Run verification command over the whole list file, -an -ai@ reads archive
+        # names from it; a bare -p sets an empty password so encrypted archives
+        # fail instead of prompting
         process = subprocess.Popen(
-            [seven_zip_exe, "t", "-p\"\"", file_path],
+            [seven_zip_exe, "t", "-an", f"-ai@{list_file}", "-p", "-mmt=on",
+             "-bsp0", "-bse1", "-y", "-sccUTF-8", "-scsUTF-8"],
+            stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            encoding='utf-8',
-            errors='replace'
+            **SUBPROCESS_GROUP_KWARGS
         )
-        
-        # Register process in the global dictionary
+
+        # Register process in the global set
         with current_processes_lock:
-            current_processes[file_path] = process
-            
-        output, _ = process.communicate()
-        
-        # Parse verification results
-        encrypted_keywords = {'password', 'encrypted'}
-        is_encrypted = any(kw in output.lower() for kw in encrypted_keywords)
-        
-        # Thread-safe file update with file lock
-        with threading.Lock():
-            with open(result_file, 'r', encoding='utf-8') as f_in:
-                data = json.load(f_in, object_pairs_hook=OrderedDict)
-                
-            record = data['files'].get(file_path)
-            
-            if record and record['result'] != 'deleted':
-                if process.returncode == 0:
-                    record['result'] = 'success'
-                    print(LANG("verify_success", path=file_path))
-                elif is_encrypted:
-                    record['result'] = 'encrypted'
-                    print(LANG("encrypted_file", path=file_path))
-                elif not exit_flag:
-                    record['result'] = 'failure'
-                    print(LANG("verify_fail", path=file_path))
-                else:
-                    print(LANG("interrupted", path=file_path))
-                
-                data['files'][file_path] = record
-            
-            with open(temp_file, 'w', encoding='utf-8') as f_out:
-                json.dump(data, f_out, indent=2, ensure_ascii=False)
-        
-            os.replace(temp_file, result_file)
+            current_processes.add(process)
+        # Ctrl+C may have snapshot the set just before this process was added
+        if exit_flag:
+            process.terminate()
 
-    except Exception as e:
-        print(LANG("process_error", path=file_path, error=str(e)))
-        if Path(temp_file).exists():
-            os.remove(temp_file)
+        # Attribute each banner in the output stream to the archive being tested
+        current = None
+        ok = is_encrypted = False
+        # Raw bytes are scanned line by line, only archive paths get decoded
+        for line in process.stdout:
+            match = SEVEN_ZIP_BANNER_RE.match(line)
+            if match and match.group('archive'):
+                if current:
+                    yield finish(current, ok, is_encrypted)
+                archive = match.group('archive').strip().decode('utf-8', errors='replace')
+                current = pending.get(os.path.normcase(archive))
+                ok = is_encrypted = False
+                if current:
+                    print_file_event("verifying", current)
+            elif current is None:
+                continue
+            elif match:
+                ok = True
+            elif not is_encrypted:
+                is_encrypted = SEVEN_ZIP_ENCRYPTED_RE.search(line) is not None
+        process.wait()
+
+        if current:
+            yield finish(current, ok, is_encrypted)
+        # 7-Zip prints a banner even for archives it cannot open, so unreported
+        # ones mean the run itself failed; keep them unchecked for the next run
+        for path in pending.values():
+            if not exit_flag:
+                print(LANG("process_error", path=path, error=LANG("not_reported")))
     finally:
         # Clean up process entry
-        with current_processes_lock:
-            if file_path in current_processes:
-                del current_processes[file_path]
+        if process:
+            with current_processes_lock:
+                current_processes.discard(process)
+        os.remove(list_file)
 
-def process_directory(target_dir, seven_zip_exe, check_exe, output_dir, threads=1):
-    """Main processing loop for directory scanning and file verification"""
-    signal.signal(signal.SIGINT, signal_handler)
-    
-    dir_hash = get_dir_hash(target_dir)
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-    result_file = output_path / f"result_{dir_hash}.json"
-    target_dir = target_dir.resolve()
-    physical_files = scan_physical_files(target_dir, check_exe)
+class WarningCollector(logging.Handler):
+    """Collect libarchive warnings, which libarchive-c logs instead of raising"""
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
 
-    # Initialize or load existing records
-    if not result_file.exists():
-        data = OrderedDict([
-            ("target_directory", str(target_dir)),
-            ("files", OrderedDict())
-        ])
-    else:
-        with open(result_file, 'r', encoding='utf-8') as f:
-            data = json.load(f, object_pairs_hook=OrderedDict)
-    
-    # Merge records
-    existing_files = data.get('files', OrderedDict())
-    merged_files = merge_file_records(existing_files, physical_files)
-    data['files'] = merged_files
-    
-    # Write initial state
-    with open(result_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    
-    # Count pending files
-    unchecked_files = [
-        path for path, record in data['files'].items() 
-        if record['result'] == 'unchecked' 
-        and Path(path).exists()
-    ]
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+# Warnings logged by libarchive in this worker process
+inproc_warnings = WarningCollector()
+
+def init_inproc_worker(lang, quiet_output, stop_event):
+    """Prepare an in-process verification worker"""
+    global quiet, inproc_stop
+    # The parent process handles Ctrl+C and signals workers through the event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    inproc_stop = stop_event
+    LANG.set_language(lang)
+    quiet = quiet_output
+    logger = logging.getLogger(INPROC_WARNING_LOGGER)
+    logger.addHandler(inproc_warnings)
+    logger.propagate = False
+
+def inproc_error_result(messages):
+    """Map libarchive error or warning messages to a verification result"""
+    text = " ".join(messages).lower()
+    if any(kw in text for kw in INPROC_ENCRYPTED_KEYWORDS):
+        return 'encrypted'
+    if any(kw in text for kw in INPROC_UNSUPPORTED_KEYWORDS):
+        return 'unsupported'
+    return 'failure'
+
+def verify_inproc(paths):
+    """Test archives in-process with libarchive, returning (path, result, method) tuples
+
+    Archives libarchive cannot decode get the result 'unsupported'. On
+    interruption the current archive is returned with a result of None and
+    the rest of the batch is left out.
+    """
+    results = []
+    for path in paths:
+        if inproc_stop.is_set():
+            break
+        print_file_event("verifying", path)
+        method = verify_sidecar(path)
+        if method:
+            results.append((path, 'success', method))
+            continue
+        try:
+            warnings = None
+            with libarchive.file_reader(path) as archive:
+                for entry in archive:
+                    # Header warnings (e.g. unconvertible names) are harmless,
+                    # only warnings while decoding the data mean corruption
+                    inproc_warnings.messages.clear()
+                    # Decompressing every block forces the CRC checks
+                    for _ in entry.get_blocks(INPROC_BLOCK_SIZE):
+                        if inproc_stop.is_set():
+                            results.append((path, None, None))
+                            return results
+                    if inproc_warnings.messages:
+                        warnings = inproc_warnings.messages
+                        break
+            if warnings is None:
+                results.append((path, 'success', 'libarchive'))
+            else:
+                results.append((path, inproc_error_result(warnings), 'libarchive'))
+        except libarchive.ArchiveError as e:
+            results.append((path, inproc_error_result([str(e)]), 'libarchive'))
+    return results
+
+def report_results(writer, verified, paths):
+    """Print verification results and queue them for the result writer"""
+    try:
+        for file_path, result, method in verified:
+            if result == 'success':
+                print_file_event("verify_success", file_path)
+            elif result == 'encrypted':
+                print_file_event("encrypted_file", file_path)
+            elif result == 'failure':
+                print_file_event("verify_fail", file_path)
+            else:
+                print_file_event("interrupted", file_path)
+                continue
+            try:
+                size, fp = file_fingerprint(file_path)
+            except OSError:
+                size = fp = None
+            writer.put(file_path, (result, size, fp, method))
+    except Exception as e:
+        print(LANG("process_error", path=", ".join(paths), error=str(e)))
+
+def process_batch(writer, seven_zip_exe, paths):
+    """Validate a batch of archive files using 7-Zip and update results"""
+    if exit_flag: return
+
+    # Archives matching a checksum sidecar skip the full 7-Zip decode
+    checked, remaining = [], []
+    for file_path in paths:
+        if exit_flag: return
+        method = verify_sidecar(file_path)
+        if method:
+            print_file_event("verifying", file_path)
+            checked.append((file_path, 'success', method))
+        else:
+            remaining.append(file_path)
+    if checked:
+        report_results(writer, checked, paths)
+    if remaining:
+        report_results(writer, verify_batch(seven_zip_exe, remaining), remaining)
+
+def verify_pending(writer, seven_zip_exe, unchecked_files, threads, mode='subprocess'):
+    """Verify unchecked files in batches across a thread or process pool"""
+    seven_zip_files = []
+    if mode == 'inproc':
+        # libarchive cannot join volume sets or find archives inside SFX stubs,
+        # these and archives it reports as unsupported go to 7-Zip afterwards
+        seven_zip_files = [
+            path for path in unchecked_files
+            if is_multi_volume(path) or path.lower().endswith('.exe')
+        ]
+        if seven_zip_files:
+            excluded = set(seven_zip_files)
+            unchecked_files = [path for path in unchecked_files if path not in excluded]
+
+    # Spread batches evenly so every worker gets work on small runs
     total = len(unchecked_files)
-    print(LANG("files_to_verify", total=total))
-    
-    verify_7z_availability(seven_zip_exe)
-    
-    # Create a thread pool for concurrent processing
-    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+    batch_size = max(1, min(BATCH_SIZE, -(-total // max(threads, 1))))
+
+    global inproc_stop
+    if mode == 'inproc':
+        # In-process decoding holds the GIL, so every worker gets its own process
+        inproc_stop = multiprocessing.Event()
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=threads,
+            initializer=init_inproc_worker,
+            initargs=(LANG.lang, quiet, inproc_stop)
+        )
+    else:
+        # Threads only wait on 7-Zip subprocesses, which do the decoding
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+
+    with executor:
         futures = {}
-        for file_path in unchecked_files:
+        for batch in chunks(unchecked_files, batch_size):
             if exit_flag: 
                 break
-            future = executor.submit(process_file, result_file, seven_zip_exe, file_path)
-            futures[future] = file_path
+            if mode == 'inproc':
+                future = executor.submit(verify_inproc, batch)
+            else:
+                future = executor.submit(process_batch, writer, seven_zip_exe, batch)
+            futures[future] = batch
         
         # Wait for all tasks to complete
         for future in concurrent.futures.as_completed(futures):
             if exit_flag:
-                break
-            file_path = futures[future]
+                if mode != 'inproc':
+                    break
+                # Running batches stop at the next block, drop the ones not started yet
+                for pending in futures:
+                    pending.cancel()
+            if future.cancelled():
+                continue
+            batch = futures[future]
             try:
-                future.result()  # Get the result or exception
+                result = future.result()  # Get the result or exception
+                if mode == 'inproc':
+                    seven_zip_files.extend(
+                        path for path, outcome, _ in result if outcome == 'unsupported')
+                    result = [item for item in result if item[1] != 'unsupported']
+                    report_results(writer, result, batch)
             except Exception as e:
-                print(LANG("process_error", path=file_path, error=str(e)))
+                print(LANG("process_error", path=", ".join(batch), error=str(e)))
+    inproc_stop = None
+
+    if seven_zip_files and not exit_flag:
+        if Path(seven_zip_exe).exists():
+            verify_pending(writer, seven_zip_exe, sorted(seven_zip_files), threads)
+        else:
+            # Leave them unchecked rather than report valid archives as corrupt
+            for path in seven_zip_files:
+                print(LANG("inproc_unsupported", path=path))
+
+def process_directory(target_dir, seven_zip_exe, check_exe, output_dir, threads=1,
+                      mode='subprocess'):
+    """Main processing loop for directory scanning and file verification"""
+    signal.signal(signal.SIGINT, signal_handler)
+    
+    # Resolve once, the hash and every scanned path build on it
+    target_dir = target_dir.resolve()
+    dir_hash = get_dir_hash(target_dir)
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    result_file = output_path / f"result_{dir_hash}.json"
+    db_file = output_path / f"result_{dir_hash}.db"
+    physical_files = scan_physical_files(target_dir, check_exe)
+
+    # Initialize or load existing records
+    conn = open_result_db(db_file)
+    progress_ring = ProgressRing(output_path / f"progress_{dir_hash}.bin")
+    writer = None
+    try:
+        scan_fp = scan_fingerprint(physical_files)
+        if scan_fp == load_scan_fingerprint(conn):
+            # Same files with the same mtimes as the stored state: skip the merge
+            # and the rewrite, only drop deleted records that are still missing,
+            # as the merge would
+            gone = [
+                (row[0],) for row in conn.execute(
+                    "SELECT path FROM files WHERE result = 'deleted'")
+                if row[0] not in physical_files
+            ]
+            if gone:
+                with conn:
+                    conn.executemany("DELETE FROM files WHERE path = ?", gone)
+                    bump_revision(conn)
+            pending = [
+                row[0] for row in conn.execute(
+                    "SELECT path FROM files WHERE result = 'unchecked' ORDER BY path")
+            ]
+        else:
+            data = load_results(conn, result_file, target_dir)
+            
+            # Merge records
+            existing_files = data.get('files', {})
+            merged_files = merge_file_records(existing_files, physical_files)
+            data['files'] = merged_files
+            
+            # Write initial state
+            save_results(conn, data, scan_fp)
+            pending = [
+                path for path, record in data['files'].items() 
+                if record['result'] == 'unchecked'
+            ]
+        
+        # Count pending files, the scan already tells which ones exist
+        unchecked_files = [path for path in pending if path in physical_files]
+        print(LANG("files_to_verify", total=len(unchecked_files)))
+        
+        if mode != 'inproc':
+            verify_7z_availability(seven_zip_exe)
+        writer = ResultWriter(db_file, progress_ring)
+        verify_pending(writer, seven_zip_exe, unchecked_files, threads, mode)
+    finally:
+        if writer:
+            writer.close()
+        # Compact the WAL and keep the JSON result file as the readable summary,
+        # also when the run was interrupted or failed part way
+        close_results(conn, result_file, target_dir)
+        progress_ring.close()
 
 def main():
     """Entry point for command-line execution"""
@@ -317,8 +1034,20 @@ def main():
                       type=int, 
                       default=1,
                       help=LANG("argparse_threads_help"))
+    parser.add_argument("-m", "--mode",
+                      choices=['subprocess', 'inproc'],
+                      default='subprocess',
+                      help=LANG("argparse_mode_help"))
+    parser.add_argument("-q", "--quiet",
+                      action="store_true",
+                      help=LANG("argparse_quiet_help"))
+    parser.add_argument("-w", "--watch",
+                      action="store_true",
+                      help=LANG("argparse_watch_help"))
     args = parser.parse_args()
 
+    global quiet
+    quiet = args.quiet
     if args.lang:
         LANG.set_language(args.lang)
 
@@ -327,13 +1056,23 @@ def main():
         print(LANG("dir_not_exist", path=target_dir))
         return
 
-    try:
-        verify_7z_availability(args.seven_zip)
-    except FileNotFoundError as e:
-        print(str(e))
+    if args.watch:
+        watch_progress(Path(args.output) / f"progress_{get_dir_hash(target_dir)}.bin")
         return
 
-    process_directory(target_dir, args.seven_zip, args.exe, args.output, args.threads)
+    if args.mode == 'inproc':
+        if libarchive is None:
+            print(LANG("libarchive_not_found"))
+            return
+    else:
+        try:
+            verify_7z_availability(args.seven_zip)
+        except FileNotFoundError as e:
+            print(str(e))
+            return
+
+    process_directory(target_dir, args.seven_zip, args.exe, args.output, args.threads,
+                      args.mode)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file